@@ -0,0 +1,33 @@
+# _kernels.py
+# Numba 编译的数据生成内核：把逐列的随机数生成融合为单次并行内存遍历
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def fill_sensor_columns(temperature, humidity, battery, pressure,
+                        noise_db, low_freq, mid_freq, high_freq,
+                        vib_x, vib_y, vib_z,
+                        battery_miss_rate, pressure_miss_rate):
+    """
+    单次并行遍历填充所有连续传感器列（输入为预分配的 float32 数组）
+    随机数生成、舍入和缺失值注入融合在同一个循环内完成，
+    输出缓冲区只扫一遍；prange 下每个线程持有独立的随机数状态
+    """
+    n = temperature.shape[0]
+    for i in prange(n):
+        temperature[i] = round(np.random.uniform(-10.0, 50.0), 2)
+        humidity[i] = round(np.random.uniform(10.0, 100.0), 2)
+        # 缺失值注入与取值在同一循环内完成，避免二次扫描
+        battery[i] = np.nan if np.random.random() < battery_miss_rate \
+            else round(np.random.uniform(10.0, 100.0), 2)
+        pressure[i] = np.nan if np.random.random() < pressure_miss_rate \
+            else round(np.random.uniform(950.0, 1050.0), 2)
+        noise_db[i] = round(np.random.uniform(30.0, 120.0), 2)
+        low_freq[i] = round(np.random.uniform(20.0, 100.0), 2)
+        mid_freq[i] = round(np.random.uniform(100.0, 1000.0), 2)
+        high_freq[i] = round(np.random.uniform(1000.0, 5000.0), 2)
+        vib_x[i] = round(np.random.uniform(-5.0, 5.0), 3)
+        vib_y[i] = round(np.random.uniform(-5.0, 5.0), 3)
+        vib_z[i] = round(np.random.uniform(-5.0, 5.0), 3)
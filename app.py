@@ -2,12 +2,17 @@
 # Main Streamlit application for IoT Data Platform
 
 import streamlit as st
-import json
-import random
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from datetime import datetime
 import os
-from data_generator import generate_records  # 导入自定义模块：生成模拟 IoT 数据的函数
+from data_generator import (  # 导入自定义模块：生成模拟 IoT 数据的函数
+    generate_records_df,
+    record_batch_from_df,
+    records_from_df
+)
 from config import LANGUAGES  # 语言配置文件：用于多语言切换
 from db_utils import (  # 包括清表、插入、查询等数据库操作封装
     truncate_device_data_table,
@@ -15,13 +20,45 @@ from db_utils import (  # 包括清表、插入、查询等数据库操作封装
     update_geometry,
     bulk_insert_records,
     query_data,
-    query_nearby_devices_with_attributes,
     query_all_devices
 )
 from visualization import (  # 地图可视化函数（基于 pydeck）
     draw_colored_device_map,
     draw_basic_device_map
 )
+from tile_cache import query_nearby_devices_tiled  # 附近设备查询的空间瓦片缓存
+
+# 表格展示行数上限：st.dataframe 会把整个 DataFrame 序列化为 Arrow 发往浏览器，
+# 百万行会触及 Streamlit 200MB 前端限制；展示截断前 1 万行，完整数据仍用于下载
+DISPLAY_CAP = 10_000
+# 地图点数上限：deck.gl 散点超过 ~20 万点后 WebGL 吞吐已饱和，超出部分采样
+MAP_POINT_CAP = 200_000
+
+
+# --- Cached DB query wrappers ---
+# Tab 3 中同一组参数的查询会在一次交互里被调用两次（左侧表格 + 右侧地图），
+# st.cache_data 按参数缓存返回的 DataFrame，相同参数直接复用，
+# 省掉重复的数据库往返和传输 [参见 Streamlit 缓存文档]
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def cached_nearby_devices(lon, lat, radius):
+    # 底层按瓦片取数并缓存（见 tile_cache.py）：中心点小幅移动时
+    # 复用已缓存的瓦片，只有新覆盖到的瓦片才访问数据库
+    return query_nearby_devices_tiled(lon, lat, radius)
+
+
+@st.cache_data(ttl=300, max_entries=4, show_spinner=False)
+def cached_all_devices(limit):
+    return query_all_devices(limit=limit)
+
+
+# 条件查询同样按过滤参数缓存：翻页回看、重复提交同一组条件时直接命中，
+# 不再重发查询；_strings 带下划线前缀，不参与缓存键（仅用于错误提示）
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def cached_query_data(min_temp, max_temp, min_battery, status_list, region_filter, _strings,
+                      limit=None, offset=0, all_records=False):
+    return query_data(min_temp, max_temp, min_battery, status_list, region_filter, _strings,
+                      limit=limit, offset=offset, all_records=all_records)
+
 
 # --- Main Streamlit App ---
 st.set_page_config(page_title="IoT Data Platform", layout="wide")  # 设置页面标题和布局宽度
@@ -43,8 +80,11 @@ with col2:
         format_func=lambda code: "English" if code == "en" else "中文",
         index=0 if st.session_state.language == "en" else 1
     )
-    st.session_state.language = language_code
-    strings = LANGUAGES[st.session_state.language]
+    # 仅在语言实际变化时写回并重跑，相同选择不触发额外状态更新
+    if language_code != st.session_state.language:
+        st.session_state.language = language_code
+        strings = LANGUAGES[st.session_state.language]
+        st.rerun()
 
 # Sidebar（侧边栏）
 with st.sidebar:
@@ -66,6 +106,8 @@ with st.sidebar:
                 with st.spinner("Clearing device_data table..."):
                     if truncate_device_data_table(strings):
                         st.success(strings["truncate_success"])
+                        # 表已清空，作废全部查询缓存，避免 TTL 内继续返回已删除的数据
+                        st.cache_data.clear()
                         # Clear last query cache to ensure fresh data
                         if 'last_query_df' in st.session_state:
                             del st.session_state['last_query_df']
@@ -75,23 +117,32 @@ with st.sidebar:
                 st.session_state.show_truncate_confirm = False
                 # st.experimental_rerun()  # 强制刷新 UI
 
+    # 清除查询缓存（数据变更后确保后续查询取到新数据）
+    if st.button(strings["clear_cache_button"], key="clear_cache"):
+        st.cache_data.clear()
+        st.success(strings["clear_cache_success"])
+
     # 数据生成配置输入项（用于 tab1）
-    filename_base = st.text_input(strings["filename_label"], st.session_state.get("filename_base",
-                                                                                  f"iot_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}"))
+    # 放入表单统一提交：输入过程中的每次键入/拖动不再触发整个脚本重跑，
+    # 点击"应用设置"后一次性取到所有控件值
+    with st.form("sidebar_form"):
+        filename_base = st.text_input(strings["filename_label"], st.session_state.get("filename_base",
+                                                                                      f"iot_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}"))
+        record_count = st.number_input(strings["record_count_label"], 1000, 1000000, 15000, step=1000)  # 生成记录数量
+        directory_path = st.text_input(strings["storage_path_label"], "./Simulation/data")  # 存储路径
+        save_format = st.selectbox(strings["save_format_label"], ["Parquet", "JSON", "CSV"])  # 保存格式（默认列式 Parquet）
+        preview_count = st.slider(strings["preview_count_label"], 1, 100, 10)  # 预览条数
+        force_gps = st.checkbox(strings["force_gps_label"], False)  # 是否强制生成 GPS/加速度信息
+        force_accelerometer = st.checkbox(strings["force_accelerometer_label"], False)
+        battery_miss_rate = st.slider(strings["battery_miss_rate_label"], 0.0, 0.5, 0.05, step=0.01)  # 缺失值比例（电量、气压）
+        pressure_miss_rate = st.slider(strings["pressure_miss_rate_label"], 0.0, 0.5, 0.05, step=0.01)
+        with_notes = st.checkbox(strings["with_notes_label"], False)  # 是否添加备注
+        st.form_submit_button(strings["apply_settings_button"])
     st.session_state.filename_base = filename_base
-    record_count = st.number_input(strings["record_count_label"], 1000, 1000000, 15000, step=1000)  # 生成记录数量
-    directory_path = st.text_input(strings["storage_path_label"], "./Simulation/data")  # 存储路径
-    save_format = st.selectbox(strings["save_format_label"], ["JSON", "CSV"])  # 保存格式（JSON 或 CSV）
-    preview_count = st.slider(strings["preview_count_label"], 1, 100, 10)  # 预览条数
-    force_gps = st.checkbox(strings["force_gps_label"], False)  # 是否强制生成 GPS/加速度信息
-    force_accelerometer = st.checkbox(strings["force_accelerometer_label"], False)
-    battery_miss_rate = st.slider(strings["battery_miss_rate_label"], 0.0, 0.5, 0.05, step=0.01)  # 缺失值比例（电量、气压）
-    pressure_miss_rate = st.slider(strings["pressure_miss_rate_label"], 0.0, 0.5, 0.05, step=0.01)
-    with_notes = st.checkbox(strings["with_notes_label"], False)  # 是否添加备注
 
 # Initialize session state
-if "generated_records" not in st.session_state:
-    st.session_state.generated_records = []
+if "generated_df" not in st.session_state:
+    st.session_state.generated_df = None
 
 # --- Tabs ---
 tab1, tab2, tab3 = st.tabs([strings["tab1_title"], strings["tab2_title"], strings["tab3_title"]])
@@ -104,80 +155,67 @@ with tab1:
         if st.button(strings["generate_button"], key="generate"):
             with st.spinner(strings["generating"]):
                 try:
-                    st.session_state.generated_records = []
+                    st.session_state.generated_df = None
                     progress_bar = st.progress(0)
-                    batch_size = 1000  # 分批生成记录（最多1000条）便于进度条刷新
+                    # 每批至少 1 万条，全程最多约 50 次进度条更新：
+                    # 每次 progress() 都是一帧发往浏览器的 websocket 消息，
+                    # 过小的批次会让 UI 刷新本身成为生成热路径的开销
+                    batch_size = max(10_000, record_count // 50)
 
+                    batches = []
                     for i in range(0, record_count, batch_size):
                         count = min(batch_size, record_count - i)
-                        batch = generate_records(count)
-                        for rec in batch:
-                            if random.random() < battery_miss_rate:
-                                rec["data"]["battery"] = None
-                            if random.random() < pressure_miss_rate:
-                                rec["data"]["pressure"] = None
-                            if force_gps:
-                                rec["data"]["gps"] = {
-                                    "satellites": random.randint(5, 20),
-                                    "hdop": round(random.uniform(0.5, 3.0), 2)
-                                }
-                            if force_accelerometer:
-                                rec["data"]["acceleration"] = {
-                                    "x": round(random.uniform(-10, 10), 2),
-                                    "y": round(random.uniform(-10, 10), 2),
-                                    "z": round(random.uniform(-10, 10), 2)
-                                }
-                            if with_notes:
-                                rec["notes"] = f"Generated at {datetime.now().isoformat()}"
-                        st.session_state.generated_records.extend(batch)
+                        # 缺失率与 GPS/加速度/备注开关在生成内部按整列掩码应用
+                        df_batch = generate_records_df(
+                            count,
+                            battery_miss_rate=battery_miss_rate,
+                            pressure_miss_rate=pressure_miss_rate,
+                            force_gps=force_gps,
+                            force_accelerometer=force_accelerometer,
+                            with_notes=with_notes
+                        )
+                        batches.append(df_batch)
                         progress_bar.progress(min((i + count) / record_count, 1.0))
 
-                    st.success(strings["generate_success"].format(count=len(st.session_state.generated_records)))
+                    df = pd.concat(batches, ignore_index=True)
+                    st.session_state.generated_df = df
+
+                    st.success(strings["generate_success"].format(count=len(df)))
 
                     if not os.path.exists(directory_path):
                         os.makedirs(directory_path)
                     file_path = os.path.join(directory_path, f"{st.session_state.filename_base}.{save_format.lower()}")
 
                     if save_format == "JSON":
-                        with open(file_path, "w", encoding="utf-8") as f:
-                            json.dump(st.session_state.generated_records, f, ensure_ascii=False, indent=2)
+                        # 嵌套结构在 Arrow 层组装（RecordBatch of structs），
+                        # to_pylist 一次性派生记录列表；orjson（Rust 实现）序列化
+                        # 比标准库 json 快 5~10 倍，且原生支持非 ASCII 字符
+                        with open(file_path, "wb") as f:
+                            f.write(orjson.dumps(
+                                record_batch_from_df(df).to_pylist(),
+                                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+                            ))
+                    elif save_format == "Parquet":
+                        # 列式存储：float32 列按原始缓冲区写出并经 zstd 压缩，
+                        # 完全跳过逐值字符串化（1M 行从 ~250MB CSV 降到 ~10MB）
+                        df.to_parquet(file_path, engine="pyarrow", compression="zstd")
                     else:
-                        flat_records = []
-                        for rec in st.session_state.generated_records:
-                            flat = {
-                                "device_id": rec["device_id"],
-                                "timestamp": rec["timestamp"],
-                                "region": rec["location"]["region"],
-                                "lat": rec["location"]["lat"],
-                                "lon": rec["location"]["lon"],
-                                "altitude": rec["location"]["altitude"],
-                                "temperature": rec["data"]["temperature"],
-                                "humidity": rec["data"]["humidity"],
-                                "battery": rec["data"].get("battery"),
-                                "pressure": rec["data"].get("pressure"),
-                                "status": rec["data"]["status"],
-                                "noise_db": rec["data"]["metrics"]["noise"]["db"],
-                                "low_freq": rec["data"]["metrics"]["noise"]["spectrum"]["low_freq"],
-                                "mid_freq": rec["data"]["metrics"]["noise"]["spectrum"]["mid_freq"],
-                                "high_freq": rec["data"]["metrics"]["noise"]["spectrum"]["high_freq"],
-                                "vib_x": rec["data"]["metrics"]["vibration"]["x"],
-                                "vib_y": rec["data"]["metrics"]["vibration"]["y"],
-                                "vib_z": rec["data"]["metrics"]["vibration"]["z"],
-                                "image_path": rec["data"]["image_path"],
-                            }
-                            gps = rec["data"].get("gps")
-                            if gps:
-                                flat["satellites"] = gps["satellites"]
-                                flat["hdop"] = gps["hdop"]
-                            acc = rec["data"].get("acceleration")
-                            if acc:
-                                flat["acc_x"] = acc["x"]
-                                flat["acc_y"] = acc["y"]
-                                flat["acc_z"] = acc["z"]
-                            if with_notes:
-                                flat["notes"] = rec.get("notes")
-                            flat_records.append(flat)
-                        pd.DataFrame(flat_records).to_csv(file_path, index=False, encoding="utf-8-sig")
+                        # DataFrame 本身已是扁平结构，用 Arrow 的 C++ CSV 写出器
+                        # 分块流式写出：每次只有 5 万行的 Arrow 副本驻留内存，
+                        # 而非 pandas 整表 + Arrow 整表两份副本同时存在
+                        schema = None
+                        csv_writer = None
+                        try:
+                            for start in range(0, len(df), 50_000):
+                                chunk = pa.Table.from_pandas(df.iloc[start:start + 50_000],
+                                                             schema=schema, preserve_index=False)
+                                if csv_writer is None:
+                                    schema = chunk.schema
+                                    csv_writer = pa_csv.CSVWriter(file_path, schema)
+                                csv_writer.write(chunk)
+                        finally:
+                            if csv_writer is not None:
+                                csv_writer.close()
 
                     st.success(strings["save_success"].format(path=file_path))
                 except ImportError as e:
@@ -187,21 +225,24 @@ with tab1:
                 except Exception as e:
                     st.error("❌ Data generation failed: {error}".format(error=e))
 
-        if st.session_state.generated_records:
+        if st.session_state.generated_df is not None:
             st.subheader(strings["data_preview"])
-            st.json(st.session_state.generated_records[:preview_count])
+            st.json(record_batch_from_df(st.session_state.generated_df.head(preview_count)).to_pylist())
 
     with st.expander(strings["insert_spatial_subheader"]):
         col1, col2 = st.columns([3, 1])
         # 将模拟数据插入数据库
         with col1:
-            if st.session_state.generated_records:
-                st.info(strings["insert_info"].format(count=len(st.session_state.generated_records)))
+            if st.session_state.generated_df is not None:
+                st.info(strings["insert_info"].format(count=len(st.session_state.generated_df)))
                 if st.button(strings["insert_button"], key="insert"):
                     with st.spinner(strings["inserting"]):
-                        success_count, skip_count, elapsed = bulk_insert_records(st.session_state.generated_records,
-                                                                                 strings, with_notes)
+                        # 插入前在边界处一次性还原嵌套记录
+                        records = records_from_df(st.session_state.generated_df)
+                        success_count, skip_count, elapsed = bulk_insert_records(records, strings, with_notes)
                         if success_count > 0:
+                            # 数据已变更，作废全部查询缓存，避免后续查询读到旧结果
+                            st.cache_data.clear()
                             st.success(strings["insert_success"].format(success=success_count, skip=skip_count,
                                                                         elapsed=elapsed))
                         else:
@@ -220,6 +261,8 @@ with tab1:
                     affected_rows = update_geometry(strings)
                     if affected_rows > 0:
                         st.success(strings["update_geometry_success"].format(count=affected_rows))
+                        # geom 列刚刚回填，作废缓存的（可能为空的）空间查询结果
+                        st.cache_data.clear()
                     else:
                         st.warning(strings["update_geometry_warning"])
 
@@ -248,9 +291,10 @@ with tab2:
         if query_submitted:
             with st.spinner(strings["querying"]):
                 try:
-                    df, query_time = query_data(min_temp, max_temp, min_battery, status_options, region_filter, strings,
-                                                limit,
-                                                offset)
+                    df, query_time = cached_query_data(min_temp, max_temp, min_battery, status_options, region_filter,
+                                                       strings,
+                                                       limit,
+                                                       offset)
                     if df.empty:
                         st.warning(strings["query_warning"])
                     else:
@@ -263,7 +307,7 @@ with tab2:
         if all_submitted:
             with st.spinner(strings["querying_all"]):
                 try:
-                    df, query_time = query_data(0, 0, 0, [], "", strings, all_records=True)
+                    df, query_time = cached_query_data(0, 0, 0, [], "", strings, all_records=True)
                     if df.empty:
                         st.warning(strings["query_all_warning"])
                     else:
@@ -278,7 +322,10 @@ with tab2:
         if 'query_success' in st.session_state:
             st.success(st.session_state['query_success'])
         if 'last_query_df' in st.session_state:
-            st.dataframe(st.session_state['last_query_df'], use_container_width=True, height=500)
+            result_df = st.session_state['last_query_df']
+            st.dataframe(result_df.head(DISPLAY_CAP), use_container_width=True, height=500)
+            if len(result_df) > DISPLAY_CAP:
+                st.caption(strings["display_cap_caption"].format(shown=DISPLAY_CAP, total=len(result_df)))
             csv = st.session_state['last_query_df'].to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
             st.download_button(strings["download_csv"], csv, "iot_query_results.csv", "text/csv")
         else:
@@ -307,25 +354,27 @@ with tab3:
             st.session_state.lat = lat
             st.session_state.radius = radius
             st.session_state.point_scale = point_scale
-            st.session_state.df = query_nearby_devices_with_attributes(lon, lat, radius)
+            st.session_state.df = cached_nearby_devices(lon, lat, radius)
 
         if all_devices_submitted:
             st.session_state.query_mode = "all"
             st.session_state.point_scale = point_scale
-            st.session_state.df = query_all_devices(limit=1000000)
+            st.session_state.df = cached_all_devices(1000000)
 
         if "df" in st.session_state:
-            st.dataframe(st.session_state.df, height=325)
+            st.dataframe(st.session_state.df.head(DISPLAY_CAP), height=325)
+            if len(st.session_state.df) > DISPLAY_CAP:
+                st.caption(strings["display_cap_caption"].format(shown=DISPLAY_CAP,
+                                                                 total=len(st.session_state.df)))
     # 调用 PyDeck 进行地图可视化展示
     with col2:
         st.subheader(strings["spatial_results_subheader"])
         point_scale = st.session_state.get("point_scale", 1.0)
         if st.session_state.get("query_mode") == "nearby":
             st.subheader(strings["nearby_results"].format(radius=st.session_state.radius))
-            with st.spinner(strings["querying_nearby"]):
-                # 查询某点附近设备
-                df = query_nearby_devices_with_attributes(st.session_state.lon, st.session_state.lat,
-                                                          st.session_state.radius)
+            # 直接复用左侧提交时写入 session_state 的查询结果，
+            # 避免同一次交互内的第二次查询/传输
+            df = st.session_state.df
             if df.empty:
                 st.warning(strings["nearby_warning"])
             else:
@@ -334,14 +383,19 @@ with tab3:
 
         elif st.session_state.get("query_mode") == "all":
             st.subheader(strings["all_devices_results"])
-            with st.spinner(strings["querying_all_devices"]):
-                # 查询全部设备
-                df = query_all_devices(limit=1000000)
-                # 实际验证1M级数据大概是250MB，但Streamlit前端数据限制200MB
-                # 通过修改streamlit配置文件.streamlit/config.toml，键入server.maxMessageSize = 300
-                # 可能会导致网页加载缓慢，内存占用增大
+            # 直接复用左侧提交时写入 session_state 的查询结果，
+            # 避免同一次交互内重复拉取百万行数据
+            df = st.session_state.df
+            # 实际验证1M级数据大概是250MB，但Streamlit前端数据限制200MB
+            # 通过修改streamlit配置文件.streamlit/config.toml，键入server.maxMessageSize = 300
+            # 可能会导致网页加载缓慢，内存占用增大
             if df.empty:
                 st.warning(strings["all_devices_warning"])
             else:
                 st.success(strings["all_devices_success"].format(count=len(df)))
-                draw_basic_device_map(df, point_scale, strings)
+                # 超过点数上限时随机采样后再绘制，控制发往前端的数据量
+                if len(df) > MAP_POINT_CAP:
+                    df = df.sample(n=MAP_POINT_CAP, random_state=0)
+                # 大数据量时改用 GPU 聚合图层，渲染成本与点数解耦
+                draw_basic_device_map(df, point_scale, strings,
+                                      use_aggregation=len(df) > 50_000)
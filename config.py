@@ -12,6 +12,9 @@ LANGUAGES = {
         "cancel_clear_button": "❌ Cancel",
         "truncate_success": "✅ Device data table cleared successfully",
         "truncate_error": "❌ Failed to clear device data table: {error}",
+        "clear_cache_button": "🧹 Clear Query Cache",
+        "clear_cache_success": "✅ Query cache cleared",
+        "apply_settings_button": "💾 Apply Settings",
         "filename_label": "Filename Prefix",
         "record_count_label": "Record Count",
         "storage_path_label": "Storage Path",
@@ -83,6 +86,7 @@ LANGUAGES = {
         "nearby_warning": "❗ No nearby devices found",
         "all_devices_warning": "❗ No device data found",
         "map_warning": "⚠️ Data empty, cannot draw map.",
+        "display_cap_caption": "Showing first {shown} of {total} rows",
         "language_label": "Language",
         "device_id": "Device ID",
         "status": "Status",
@@ -97,6 +101,9 @@ LANGUAGES = {
         "cancel_clear_button": "❌ 取消",
         "truncate_success": "✅ 设备数据表已成功清除",
         "truncate_error": "❌ 清除设备数据表失败：{error}",
+        "clear_cache_button": "🧹 清除查询缓存",
+        "clear_cache_success": "✅ 查询缓存已清除",
+        "apply_settings_button": "💾 应用设置",
         "filename_label": "文件名前缀",
         "record_count_label": "记录数量",
         "storage_path_label": "存储路径",
@@ -168,6 +175,7 @@ LANGUAGES = {
         "nearby_warning": "❗ 未找到附近设备",
         "all_devices_warning": "❗ 没有设备数据",
         "map_warning": "⚠️ 数据为空，无法绘制地图。",
+        "display_cap_caption": "仅显示前 {shown} 行（共 {total} 行）",
         "language_label": "语言",
         "device_id": "设备ID",
         "status": "状态",
@@ -1,37 +1,67 @@
 import os
-import random
-import string
 import json
-from datetime import datetime, timedelta
-from shapely.geometry import Point, shape
-
-# ===== 读取中国省级行政区边界 GeoJSON 文件 =====
-# 该文件存储了各省的地理边界信息，后续用于判断随机生成的点是否在对应省内
-with open("D:\jupyter_my\iot\Simulation\json\china.json", "r", encoding="utf-8") as f:
-    china_geo = json.load(f)
-
-# 解析 GeoJSON 文件，提取每个省份的多边形边界，并存入 province_shapes 字典
-province_shapes = {}
-
-# 省份对应的人口密度权重，用于加权随机选择省份，人口密度越大，生成数据的概率越高
-province_densities = {
-    "北京市": 10, "天津市": 5, "河北省": 5, "山西省": 4, "内蒙古自治区": 3, "辽宁省": 6, "吉林省": 4, "黑龙江省": 4,
-    "上海市": 10, "江苏省": 8, "浙江省": 7, "安徽省": 5, "福建省": 6, "江西省": 4, "山东省": 8, "河南省": 6,
-    "湖北省": 5, "湖南省": 5, "广东省": 9, "广西壮族自治区": 4, "海南省": 3, "重庆市": 6, "四川省": 7, "贵州省": 3,
-    "云南省": 4, "西藏自治区": 1, "陕西省": 5, "甘肃省": 3, "青海省": 2, "宁夏回族自治区": 2, "新疆维吾尔自治区": 2,
-    "台湾省": 5, "香港特别行政区": 10, "澳门特别行政区": 10
-}
-
-# 遍历 GeoJSON 中每个行政区，提取名称和边界几何形状，存储到 province_shapes 中
-for feature in china_geo["features"]:
-    name = feature["properties"].get("name")
-    if name in province_densities:
-        # 使用 shapely 的 shape 函数将 GeoJSON 几何数据转成多边形对象，方便后续点包含判断
-        province_shapes[name] = shape(feature["geometry"])
-
-# 生成省份名称列表和对应的权重列表，方便后续带权重随机选省份
-province_names = list(province_shapes.keys())
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import shapely
+
+from _kernels import fill_sensor_columns
+from geo import load_china_union, load_province_geo, province_densities
+
+# ===== 随机数发生器 =====
+# PCG64（np.random.default_rng）比全局 random 模块的 MT19937 每样本快约一倍，
+# 没有全局锁，批量取样还能摊销 Python→C 的调度开销
+# （Numba 内核内部使用其自带的按线程随机状态，不经过这里）
+_RNG = np.random.default_rng()
+
+
+def set_seed(seed=None):
+    """
+    重置模块随机数发生器的种子，便于生成可复现的数据
+    """
+    global _RNG
+    _RNG = np.random.default_rng(seed)
+
+# ===== 加载中国省级行政区边界及预计算结构 =====
+# 解析/构建缓存在 geo.py 中（pickle 磁盘缓存 + st.cache_resource 进程内缓存），
+# 避免 Streamlit 每次 rerun 都重新解析 GeoJSON 并重建几何对象
+(province_shapes, province_polys,
+ province_names, _province_weights, province_bounds) = load_province_geo()
+
+# 省份权重列表，及只计算一次的归一化累积权重
+# 省份抽样用 searchsorted 在累积权重上二分，避免每次抽样重建累积和
 province_weights = [province_densities[p] for p in province_names]
+_cum_weights = np.cumsum(_province_weights)
+_cum_weights /= _cum_weights[-1]
+
+# 全国合并边界，用于批量境内判断
+_china_union = load_china_union()
+
+# 时间戳取值范围（秒级 epoch）：生成阶段只抽取 8 字节整数，
+# 19 字符的字符串格式化推迟到输出边界一次性完成
+_START_EPOCH = int(datetime(2024, 1, 1).timestamp())
+_END_EPOCH = int(datetime(2025, 12, 31).timestamp()) + 86400
+
+# 预生成的设备ID池：生成时从池中抽样（复用同一批字符串对象），
+# 避免每条记录 6 次临时字符串分配；也更贴近真实场景——
+# 同一个传感器ID会出现在多条记录中
+_DEVICE_POOL = np.array([f"sensor_{i:05d}" for i in range(100_000)], dtype=object)
+
+
+def is_inside_china_batch(lats, lons):
+    """
+    批量判断经纬度点是否位于中国境内
+    对全国合并边界做一次向量化 contains_xy，内循环完全在 GEOS/C 层执行
+    参数:
+        lats: 纬度数组
+        lons: 经度数组
+    返回:
+        布尔 NumPy 数组
+    """
+    return shapely.contains_xy(_china_union, np.asarray(lons), np.asarray(lats))
 
 
 def is_inside_china(lat, lon):
@@ -43,59 +73,103 @@ def is_inside_china(lat, lon):
     返回:
         True 或 False
     """
-    pt = Point(lon, lat)  # shapely 的点，注意经度在前，纬度在后
-    # 遍历所有省的边界，判断点是否被包含
-    return any(poly.contains(pt) for poly in province_shapes.values())
+    return bool(is_inside_china_batch(np.array([lat]), np.array([lon]))[0])
 
 
 def random_device_id():
     """
-    生成随机设备ID，格式为 'sensor_XXXXX'，X为数字
+    返回一个随机设备ID，格式为 'sensor_XXXXX'，X为数字
+    从预生成的ID池中抽取，不做逐次字符串拼接
     """
-    return "sensor_" + ''.join(random.choices(string.digits, k=5))
+    return _DEVICE_POOL[int(_RNG.integers(len(_DEVICE_POOL)))]
 
 
 def random_timestamp(start_year=2024, end_year=2025):
     """
     生成一个随机时间戳，范围从 start_year 年初到 end_year 年末
     返回字符串格式 'YYYY-MM-DD HH:MM:SS'
+    内部按秒级 epoch 抽取，仅在返回时格式化
     """
-    start = datetime(start_year, 1, 1)
-    end = datetime(end_year, 12, 31)
-    delta = end - start
-    # 随机选择天数和秒数
-    random_days = random.randint(0, delta.days)
-    random_seconds = random.randint(0, 86400)
-    return (start + timedelta(days=random_days, seconds=random_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+    start = int(datetime(start_year, 1, 1).timestamp())
+    end = int(datetime(end_year, 12, 31).timestamp()) + 86400
+    return datetime.fromtimestamp(int(_RNG.integers(start, end))).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _sample_points_in_province(province_idx, count):
+    """
+    在指定省份边界内批量采样 count 个经纬度点
+    - 在省份边界框内一次性生成一批候选点（过量生成，默认3倍）
+    - 使用 shapely.contains_xy 在 GEOS 层一次性做包含判断，避免逐点构造 Point
+    - 命中数不足时追加生成下一批，直到凑够 count 个
+    返回 (lons, lats) 两个 NumPy 数组
+    """
+    poly = province_polys[province_idx]
+    minx, miny, maxx, maxy = province_bounds[province_idx]
+    lons = np.empty(0)
+    lats = np.empty(0)
+    while lons.size < count:
+        # 过量生成候选点，降低补采次数
+        k = max((count - lons.size) * 3, 32)
+        cand_lon = np.round(_RNG.uniform(minx, maxx, k), 6)
+        cand_lat = np.round(_RNG.uniform(miny, maxy, k), 6)
+        mask = shapely.contains_xy(poly, cand_lon, cand_lat)  # 向量化包含判断
+        lons = np.concatenate([lons, cand_lon[mask]])
+        lats = np.concatenate([lats, cand_lat[mask]])
+    return lons[:count], lats[:count]
+
+
+def sample_province_indices(n):
+    """
+    按人口密度权重一次性抽取 n 个省份索引
+    一批均匀随机数 + 在预计算累积权重上 searchsorted（C 层二分），
+    替代逐条调用 random.choices 时的累积和重建
+    """
+    return np.searchsorted(_cum_weights, _RNG.random(n), side="right")
+
+
+def generate_location_columns(n):
+    """
+    批量生成 n 个随机位置的列式数据
+    - 一次性按权重抽取 n 个省份索引
+    - 按省份分组，在各省边界内批量采样经纬度
+    返回 (lats, lons, altitudes, regions) 四个 NumPy 数组
+    """
+    idx = sample_province_indices(n)
+    # 经纬度保留 float64：6 位小数精度超出 float32 的 ~7 位有效数字
+    lats = np.empty(n)
+    lons = np.empty(n)
+    # 海拔取值范围窄（0~2000，两位小数），float32 足够且带宽减半
+    altitudes = np.round(_RNG.uniform(0, 2000, n), 2).astype(np.float32)
+    regions = np.empty(n, dtype=object)
+
+    # 按省份分组批量采样，再按原始顺序填回
+    for province_idx, count in zip(*np.unique(idx, return_counts=True)):
+        p_lons, p_lats = _sample_points_in_province(province_idx, count)
+        pos = np.flatnonzero(idx == province_idx)
+        lons[pos] = p_lons
+        lats[pos] = p_lats
+        regions[pos] = province_names[province_idx]
+    return lats, lons, altitudes, regions
+
+
+def generate_locations(n):
+    """
+    批量生成 n 个随机地理位置，返回位置字典列表
+    """
+    lats, lons, altitudes, regions = generate_location_columns(n)
+    return [
+        {"lat": float(lats[i]), "lon": float(lons[i]), "altitude": float(altitudes[i]), "region": regions[i]}
+        for i in range(n)
+    ]
 
 
 def random_location():
     """
     生成一个随机地理位置
-    - 先基于省份权重随机选择一个省
-    - 在该省的边界框内生成随机经纬度，判断点是否在省内
-    - 成功则返回一个包含经度、纬度、高度和所属省份的字典
-    """
-    while True:
-        # 按权重随机选择省份
-        province = random.choices(province_names, weights=province_weights, k=1)[0]
-        poly = province_shapes[province]
-
-        # 获取省边界的最小最大经纬度范围
-        minx, miny, maxx, maxy = poly.bounds
-        for _ in range(10):  # 最多尝试10次生成点
-            lat = round(random.uniform(miny, maxy), 6)  # 纬度
-            lon = round(random.uniform(minx, maxx), 6)  # 经度
-            pt = Point(lon, lat)
-            # 判断点是否真正落在省边界内
-            if poly.contains(pt):
-                altitude = round(random.uniform(0, 2000), 2)  # 生成一个0-2000米之间的随机海拔
-                return {
-                    "lat": lat,
-                    "lon": lon,
-                    "altitude": altitude,
-                    "region": province
-                }
+    - 基于省份权重随机选择一个省，并在省界内采样一个点
+    - 返回一个包含经度、纬度、高度和所属省份的字典
+    """
+    return generate_locations(1)[0]
 
 
 def random_optional(value_func, miss_rate=0.05):
@@ -105,7 +179,7 @@ def random_optional(value_func, miss_rate=0.05):
     - value_func: 生成值的函数
     返回生成的值或 None
     """
-    return value_func() if random.random() > miss_rate else None
+    return value_func() if _RNG.random() > miss_rate else None
 
 
 def generate_device_data():
@@ -114,59 +188,64 @@ def generate_device_data():
     包含温度、湿度、电池电量、气压、状态、噪声频谱、振动加速度等多项指标
     部分数据存在缺失概率
     """
+    def uniform(a, b, ndigits=2):
+        # 标量取样同样走 PCG64，float() 保证后续 json 序列化兼容
+        return round(float(_RNG.uniform(a, b)), ndigits)
+
     data = {
-        "temperature": round(random.uniform(-10, 50), 2),  # 温度，范围 -10~50°C
-        "humidity": round(random.uniform(10, 100), 2),  # 湿度，范围 10%~100%
-        "battery": random_optional(lambda: round(random.uniform(10, 100), 2)),  # 电池电量，部分缺失
-        "pressure": random_optional(lambda: round(random.uniform(950, 1050), 2)),  # 气压，部分缺失
-        "status": random.choice(["OK", "WARN", "ERROR"]),  # 设备状态
+        "temperature": uniform(-10, 50),  # 温度，范围 -10~50°C
+        "humidity": uniform(10, 100),  # 湿度，范围 10%~100%
+        "battery": random_optional(lambda: uniform(10, 100)),  # 电池电量，部分缺失
+        "pressure": random_optional(lambda: uniform(950, 1050)),  # 气压，部分缺失
+        "status": ["OK", "WARN", "ERROR"][int(_RNG.integers(3))],  # 设备状态
         "metrics": {
             "noise": {  # 噪声相关指标
-                "db": round(random.uniform(30, 120), 2),  # 分贝
+                "db": uniform(30, 120),  # 分贝
                 "spectrum": {  # 噪声频谱
-                    "low_freq": round(random.uniform(20, 100), 2),
-                    "mid_freq": round(random.uniform(100, 1000), 2),
-                    "high_freq": round(random.uniform(1000, 5000), 2)
+                    "low_freq": uniform(20, 100),
+                    "mid_freq": uniform(100, 1000),
+                    "high_freq": uniform(1000, 5000)
                 }
             },
             "vibration": {  # 振动加速度，x,y,z轴，单位可自定义
-                "x": round(random.uniform(-5, 5), 3),
-                "y": round(random.uniform(-5, 5), 3),
-                "z": round(random.uniform(-5, 5), 3)
+                "x": uniform(-5, 5, 3),
+                "y": uniform(-5, 5, 3),
+                "z": uniform(-5, 5, 3)
             }
         }
     }
 
     # 80%概率添加 GPS 信息，包含卫星数和水平精度因子 hdop
-    if random.random() > 0.2:
+    if _RNG.random() > 0.2:
         data["gps"] = {
-            "satellites": random.randint(5, 20),
-            "hdop": round(random.uniform(0.5, 3.0), 2)
+            "satellites": int(_RNG.integers(5, 21)),
+            "hdop": uniform(0.5, 3.0)
         }
 
     # 50%概率添加加速度信息，x,y,z轴加速度
-    if random.random() > 0.5:
+    if _RNG.random() > 0.5:
         data["acceleration"] = {
-            "x": round(random.uniform(-10, 10), 2),
-            "y": round(random.uniform(-10, 10), 2),
-            "z": round(random.uniform(-10, 10), 2)
+            "x": uniform(-10, 10),
+            "y": uniform(-10, 10),
+            "z": uniform(-10, 10)
         }
 
     # image_path 字段，随机选择图片路径或 None
-    data["image_path"] = random.choice([f"/images/{random.randint(1, 1000)}.jpg", None])
+    data["image_path"] = f"/images/{int(_RNG.integers(1, 1001))}.jpg" if _RNG.random() < 0.5 else None
 
     return data
 
 
-def generate_single_record():
+def generate_single_record(location=None):
     """
     生成单条完整的设备数据记录
     包含设备ID、时间戳、地理位置和传感器数据
+    location 可传入预先批量生成的位置字典，避免逐条调用 random_location
     """
     return {
         "device_id": random_device_id(),
         "timestamp": random_timestamp(),
-        "location": random_location(),
+        "location": location if location is not None else random_location(),
         "data": generate_device_data()
     }
 
@@ -174,8 +253,225 @@ def generate_single_record():
 def generate_records(n=10000):
     """
     生成 n 条设备数据记录，返回列表
+    地理位置通过 generate_locations 批量预生成，再逐条组装记录
+    """
+    locations = generate_locations(n)
+    return [generate_single_record(location=loc) for loc in locations]
+
+
+def generate_records_df(n=10000, battery_miss_rate=0.05, pressure_miss_rate=0.05,
+                        force_gps=False, force_accelerometer=False, with_notes=False):
+    """
+    向量化生成 n 条设备数据记录，返回扁平的 pandas DataFrame
+    每个字段整列一次生成（每字段一次 C 调用），替代逐条记录的 Python 循环
+    缺失率与 GPS/加速度/备注开关直接以掩码方式在列级应用
+    列结构与 CSV 导出格式一致；嵌套记录格式可用 records_from_df 还原
+    """
+    lats, lons, altitudes, regions = generate_location_columns(n)
+
+    # 设备ID：整列从预生成的ID池中索引抽样
+    device_ids = _DEVICE_POOL[_RNG.integers(0, len(_DEVICE_POOL), n)]
+
+    # 时间戳：整列抽取 int64 秒级 epoch，再一次性转为 datetime64（8 字节/值）
+    timestamps = pd.to_datetime(_RNG.integers(_START_EPOCH, _END_EPOCH, n, dtype=np.int64), unit="s")
+
+    # 连续传感器字段：预分配 float32 缓冲区，由 Numba 内核单次并行遍历填满
+    # （随机数、舍入与电量/气压缺失注入在同一循环内融合，见 _kernels.py）
+    temperature = np.empty(n, dtype=np.float32)
+    humidity = np.empty(n, dtype=np.float32)
+    battery = np.empty(n, dtype=np.float32)
+    pressure = np.empty(n, dtype=np.float32)
+    noise_db = np.empty(n, dtype=np.float32)
+    low_freq = np.empty(n, dtype=np.float32)
+    mid_freq = np.empty(n, dtype=np.float32)
+    high_freq = np.empty(n, dtype=np.float32)
+    vib_x = np.empty(n, dtype=np.float32)
+    vib_y = np.empty(n, dtype=np.float32)
+    vib_z = np.empty(n, dtype=np.float32)
+    fill_sensor_columns(temperature, humidity, battery, pressure,
+                        noise_db, low_freq, mid_freq, high_freq,
+                        vib_x, vib_y, vib_z, battery_miss_rate, pressure_miss_rate)
+
+    # GPS 信息：默认 80% 概率存在，缺失处置为 NaN；force_gps 时全部存在
+    # satellites 取值 5~20 本可用 int16，但需要 NaN 表示缺失，用 float32 兼顾
+    satellites = _RNG.integers(5, 21, n).astype(np.float32)
+    hdop = np.round(_RNG.uniform(0.5, 3.0, n), 2).astype(np.float32)
+    if not force_gps:
+        gps_missing = _RNG.random(n) < 0.2
+        satellites[gps_missing] = np.nan
+        hdop[gps_missing] = np.nan
+
+    # 加速度信息：默认 50% 概率存在；force_accelerometer 时全部存在
+    acc_x = np.round(_RNG.uniform(-10, 10, n), 2).astype(np.float32)
+    acc_y = np.round(_RNG.uniform(-10, 10, n), 2).astype(np.float32)
+    acc_z = np.round(_RNG.uniform(-10, 10, n), 2).astype(np.float32)
+    if not force_accelerometer:
+        acc_missing = _RNG.random(n) < 0.5
+        acc_x[acc_missing] = np.nan
+        acc_y[acc_missing] = np.nan
+        acc_z[acc_missing] = np.nan
+
+    # image_path：50% 概率为图片路径，否则为 None
+    image_path = np.char.add(
+        np.char.add("/images/", _RNG.integers(1, 1001, n).astype(str)), ".jpg"
+    ).astype(object)
+    image_path[_RNG.random(n) < 0.5] = None
+
+    # 状态列：抽取 int8 编码再包成 Categorical
+    # 内部每行只存 1 字节编码（而非对象指针），展示/序列化时还原为字符串，
+    # 下游 isin 过滤和 map 着色也按编码比较
+    status = pd.Categorical.from_codes(
+        _RNG.integers(0, 3, n, dtype=np.int8), categories=["OK", "WARN", "ERROR"]
+    )
+
+    df = pd.DataFrame({
+        "device_id": device_ids,
+        "timestamp": timestamps,
+        "region": regions,
+        "lat": lats,
+        "lon": lons,
+        "altitude": altitudes,
+        "temperature": temperature,
+        "humidity": humidity,
+        "battery": battery,
+        "pressure": pressure,
+        "status": status,
+        "noise_db": noise_db,
+        "low_freq": low_freq,
+        "mid_freq": mid_freq,
+        "high_freq": high_freq,
+        "vib_x": vib_x,
+        "vib_y": vib_y,
+        "vib_z": vib_z,
+        "satellites": satellites,
+        "hdop": hdop,
+        "acc_x": acc_x,
+        "acc_y": acc_y,
+        "acc_z": acc_z,
+        "image_path": image_path,
+    })
+
+    # 备注列为同一字符串的整列广播，不做逐行格式化
+    if with_notes:
+        df["notes"] = f"Generated at {datetime.now().isoformat()}"
+    return df
+
+
+def record_batch_from_df(df):
     """
-    return [generate_single_record() for _ in range(n)]
+    将扁平 DataFrame 组装为带嵌套 struct 列的 pyarrow RecordBatch
+    列数据只存一份，嵌套结构在 Arrow 层组装（无逐行 Python 字典实例化）；
+    JSON 保存与预览通过 batch.to_pylist() 一次性派生
+    注意：缺失的 gps/加速度在此格式下为显式 null，而非省略字段
+    """
+    def col(name):
+        # from_pandas=True 让 NaN 转为 Arrow null，to_pylist 时还原为 None
+        return pa.array(df[name], from_pandas=True)
+
+    def fcol(name, ndigits=2):
+        # float32 列转回 float64 并按生成精度重舍入：
+        # 23.45 的 float32 最近值直接转 Python float 会变成 23.450000762939453，
+        # 不重舍入就把这串噪声数字写进了 JSON 导出
+        return pc.round(col(name).cast(pa.float64()), ndigits=ndigits)
+
+    location = pa.StructArray.from_arrays(
+        [col("lat"), col("lon"), fcol("altitude"), col("region")],
+        names=["lat", "lon", "altitude", "region"]
+    )
+
+    spectrum = pa.StructArray.from_arrays(
+        [fcol("low_freq"), fcol("mid_freq"), fcol("high_freq")],
+        names=["low_freq", "mid_freq", "high_freq"]
+    )
+    noise = pa.StructArray.from_arrays([fcol("noise_db"), spectrum], names=["db", "spectrum"])
+    vibration = pa.StructArray.from_arrays(
+        [fcol("vib_x", 3), fcol("vib_y", 3), fcol("vib_z", 3)], names=["x", "y", "z"]
+    )
+    metrics = pa.StructArray.from_arrays([noise, vibration], names=["noise", "vibration"])
+
+    # GPS/加速度缺失的行整个 struct 置为 null；satellites 与数据库路径一致输出整数
+    gps = pa.StructArray.from_arrays(
+        [col("satellites").cast(pa.int64()), fcol("hdop")], names=["satellites", "hdop"],
+        mask=pa.array(df["satellites"].isna())
+    )
+    acceleration = pa.StructArray.from_arrays(
+        [fcol("acc_x"), fcol("acc_y"), fcol("acc_z")], names=["x", "y", "z"],
+        mask=pa.array(df["acc_x"].isna())
+    )
+
+    data = pa.StructArray.from_arrays(
+        [fcol("temperature"), fcol("humidity"), fcol("battery"), fcol("pressure"),
+         col("status"), metrics, gps, acceleration, col("image_path")],
+        names=["temperature", "humidity", "battery", "pressure",
+               "status", "metrics", "gps", "acceleration", "image_path"]
+    )
+
+    # 时间戳一次性向量化格式化为字符串列
+    timestamps = pa.array(df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S"))
+
+    arrays = [col("device_id"), timestamps, location, data]
+    names = ["device_id", "timestamp", "location", "data"]
+    if "notes" in df.columns:
+        arrays.append(col("notes"))
+        names.append("notes")
+    return pa.record_batch(arrays, names=names)
+
+
+def records_from_df(df):
+    """
+    将扁平 DataFrame 还原为嵌套记录列表（JSON 保存 / 数据库插入格式）
+    仅在输出边界调用一次；NaN 还原为 None，GPS/加速度缺失时不输出对应字段
+    """
+    # 时间戳列整列向量化格式化一次，避免逐行调用 strftime
+    ts_strings = df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy()
+
+    records = []
+    for i, row in enumerate(df.itertuples(index=False)):
+        # NumPy 标量在边界处转回 Python float 并按生成精度重舍入：
+        # float32 直接转 float 会带出二进制表示噪声（23.45 → 23.450000762939453）
+        data = {
+            "temperature": round(float(row.temperature), 2),
+            "humidity": round(float(row.humidity), 2),
+            "battery": None if pd.isna(row.battery) else round(float(row.battery), 2),
+            "pressure": None if pd.isna(row.pressure) else round(float(row.pressure), 2),
+            "status": row.status,
+            "metrics": {
+                "noise": {
+                    "db": round(float(row.noise_db), 2),
+                    "spectrum": {
+                        "low_freq": round(float(row.low_freq), 2),
+                        "mid_freq": round(float(row.mid_freq), 2),
+                        "high_freq": round(float(row.high_freq), 2)
+                    }
+                },
+                "vibration": {"x": round(float(row.vib_x), 3),
+                              "y": round(float(row.vib_y), 3),
+                              "z": round(float(row.vib_z), 3)}
+            }
+        }
+        if not pd.isna(row.satellites):
+            data["gps"] = {"satellites": int(row.satellites), "hdop": round(float(row.hdop), 2)}
+        if not pd.isna(row.acc_x):
+            data["acceleration"] = {"x": round(float(row.acc_x), 2),
+                                    "y": round(float(row.acc_y), 2),
+                                    "z": round(float(row.acc_z), 2)}
+        data["image_path"] = row.image_path
+
+        record = {
+            "device_id": row.device_id,
+            "timestamp": ts_strings[i],
+            "location": {
+                "lat": float(row.lat),
+                "lon": float(row.lon),
+                "altitude": round(float(row.altitude), 2),
+                "region": row.region
+            },
+            "data": data
+        }
+        if "notes" in df.columns:
+            record["notes"] = row.notes
+        records.append(record)
+    return records
 
 
 def save_to_json(records, directory="output", filename="generated_data.json"):
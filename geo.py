@@ -0,0 +1,95 @@
+# geo.py
+# 省级行政区边界的加载与缓存
+# GeoJSON 解析 + shapely 几何构建有数百毫秒开销，而 Streamlit 每次交互都会
+# 重新运行脚本；这里用磁盘 pickle + st.cache_resource 双层缓存避免重复支付
+
+import json
+import os
+import pickle
+
+import numpy as np
+import shapely
+import streamlit as st
+from shapely.geometry import shape
+from shapely.ops import unary_union
+
+# 中国省级行政区边界 GeoJSON 文件路径，及其对应的 pickle 缓存路径
+GEOJSON_PATH = "D:\jupyter_my\iot\Simulation\json\china.json"
+PICKLE_PATH = os.path.splitext(GEOJSON_PATH)[0] + ".pkl"
+
+# 省份对应的人口密度权重，用于加权随机选择省份，人口密度越大，生成数据的概率越高
+province_densities = {
+    "北京市": 10, "天津市": 5, "河北省": 5, "山西省": 4, "内蒙古自治区": 3, "辽宁省": 6, "吉林省": 4, "黑龙江省": 4,
+    "上海市": 10, "江苏省": 8, "浙江省": 7, "安徽省": 5, "福建省": 6, "江西省": 4, "山东省": 8, "河南省": 6,
+    "湖北省": 5, "湖南省": 5, "广东省": 9, "广西壮族自治区": 4, "海南省": 3, "重庆市": 6, "四川省": 7, "贵州省": 3,
+    "云南省": 4, "西藏自治区": 1, "陕西省": 5, "甘肃省": 3, "青海省": 2, "宁夏回族自治区": 2, "新疆维吾尔自治区": 2,
+    "台湾省": 5, "香港特别行政区": 10, "澳门特别行政区": 10
+}
+
+
+def _build_shapes():
+    """
+    从 GeoJSON 解析省份多边形并写入 pickle 缓存
+    省界顶点数远多于本应用使用的分辨率，构建时做一次轻度简化，
+    不影响包含判断的正确性，但让后续所有 contains 调用更快
+    """
+    with open(GEOJSON_PATH, "r", encoding="utf-8") as f:
+        china_geo = json.load(f)
+
+    shapes = {}
+    for feature in china_geo["features"]:
+        name = feature["properties"].get("name")
+        if name in province_densities:
+            poly = shape(feature["geometry"])
+            shapes[name] = poly.simplify(0.001, preserve_topology=True)
+
+    try:
+        with open(PICKLE_PATH, "wb") as f:
+            pickle.dump(shapes, f, protocol=5)
+    except OSError:
+        pass  # 缓存目录不可写时跳过，不影响功能
+    return shapes
+
+
+def _load_shapes():
+    """
+    优先读取 pickle 缓存（约比 json.load + shape() 快 20 倍）
+    GeoJSON 文件更新（mtime 更新）或缓存损坏时回退到重建
+    """
+    if os.path.exists(PICKLE_PATH) and os.path.getmtime(PICKLE_PATH) >= os.path.getmtime(GEOJSON_PATH):
+        try:
+            with open(PICKLE_PATH, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            pass
+    return _build_shapes()
+
+
+@st.cache_resource
+def load_province_geo():
+    """
+    加载省份边界及所有派生的预计算结构，进程内只构建一次
+    返回 (province_shapes, province_polys, names, weights, bounds)
+    """
+    shapes = _load_shapes()
+    # 预处理几何，加速后续所有 contains / contains_xy 调用
+    for poly in shapes.values():
+        shapely.prepare(poly)
+
+    names = list(shapes.keys())
+    polys = list(shapes.values())
+    weights = np.asarray([province_densities[p] for p in names], dtype=np.float64)
+    bounds = np.array([p.bounds for p in polys])  # 每行为 (minx, miny, maxx, maxy)
+    return shapes, polys, names, weights, bounds
+
+
+@st.cache_resource
+def load_china_union():
+    """
+    全国边界的合并多边形（轻度简化并 prepare），用于批量境内判断
+    合并为单个 MultiPolygon 后，一次 contains_xy 即可校验整批候选点
+    """
+    _, polys, *_ = load_province_geo()
+    union = unary_union(polys).simplify(0.005)
+    shapely.prepare(union)
+    return union
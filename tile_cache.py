@@ -0,0 +1,101 @@
+# tile_cache.py
+# 空间瓦片缓存：把附近设备查询量化到 Web Mercator（slippy map）瓦片
+# 小幅移动中心点或调整半径时，覆盖的瓦片大多不变，直接命中缓存，
+# 只有新出现的瓦片才会真正访问数据库
+
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from db_utils import query_nearby_devices_with_attributes
+
+# 赤道周长（公里），用于估算瓦片的地面尺寸
+EQUATOR_KM = 40075.0
+
+
+def _zoom_for_radius(radius_km):
+    """选择瓦片边长约等于 2 倍查询半径的缩放级别"""
+    target = max(radius_km * 2.0, 1.0)
+    zoom = int(math.log2(EQUATOR_KM / target))
+    return min(max(zoom, 0), 18)
+
+
+def _deg2tile(lon, lat, zoom):
+    """经纬度 → 瓦片坐标 (x, y)"""
+    n = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    # 边界值截断到合法瓦片范围
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _tile_center(zoom, x, y):
+    """瓦片中心点的经纬度"""
+    n = 2 ** zoom
+    lon = (x + 0.5) / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * (y + 0.5) / n))))
+    return lon, lat
+
+
+def _tile_radius_km(zoom, x, y):
+    """覆盖整个瓦片的查询半径（按瓦片对角线的一半并留 10% 余量）"""
+    _, lat = _tile_center(zoom, x, y)
+    width_km = EQUATOR_KM * math.cos(math.radians(lat)) / 2 ** zoom
+    height_km = EQUATOR_KM / 2 ** zoom
+    return 0.55 * math.hypot(width_km, height_km)
+
+
+def tiles_for(lon, lat, radius_km):
+    """
+    计算覆盖查询圆的瓦片键列表 [(zoom, x, y), ...]
+    缩放级别由半径推导，保证圆被少量（通常 1~4 个）瓦片覆盖
+    """
+    zoom = _zoom_for_radius(radius_km)
+    # 查询圆的经纬度包围盒
+    dlat = radius_km / 111.32
+    dlon = radius_km / (111.32 * max(math.cos(math.radians(lat)), 1e-6))
+    x_min, y_min = _deg2tile(lon - dlon, lat + dlat, zoom)
+    x_max, y_max = _deg2tile(lon + dlon, lat - dlat, zoom)
+    return [(zoom, x, y)
+            for x in range(x_min, x_max + 1)
+            for y in range(y_min, y_max + 1)]
+
+
+@st.cache_data(ttl=300, max_entries=256, show_spinner=False)
+def _fetch_tile(zoom, x, y):
+    """取回覆盖指定瓦片的设备数据，按 (zoom, x, y) 缓存"""
+    lon, lat = _tile_center(zoom, x, y)
+    return query_nearby_devices_with_attributes(lon, lat, _tile_radius_km(zoom, x, y))
+
+
+def _haversine_km(lon, lat, lons, lats):
+    """中心点到一组经纬度的球面距离（公里），向量化计算"""
+    lon1, lat1 = math.radians(lon), math.radians(lat)
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    a = (np.sin((lats - lat1) / 2) ** 2
+         + math.cos(lat1) * np.cos(lats) * np.sin((lons - lon1) / 2) ** 2)
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+
+def query_nearby_devices_tiled(lon, lat, radius_km):
+    """
+    以瓦片为粒度查询附近设备
+    覆盖查询圆的每个瓦片各取一次（命中缓存则直接复用），
+    拼接去重后用向量化 haversine 过滤回真实查询圆，并按距离排序
+    """
+    frames = [_fetch_tile(zoom, x, y) for zoom, x, y in tiles_for(lon, lat, radius_km)]
+    # device_id 是从池中有放回抽取的，同一 ID 在不同位置的多条记录都是合法数据；
+    # 这里只去掉相邻瓦片重叠区域取回的同一行（ID + 坐标相同），不按 ID 折叠
+    df = pd.concat(frames, ignore_index=True) \
+        .drop_duplicates(["device_id", "longitude", "latitude"])
+    if df.empty:
+        return df.reset_index(drop=True)
+
+    dist = _haversine_km(lon, lat, df["longitude"], df["latitude"])
+    mask = dist <= radius_km
+    df = df.loc[mask].copy()
+    df["distance_km"] = dist[mask]
+    return df.sort_values("distance_km").reset_index(drop=True)